@@ -15,13 +15,29 @@ Examples:
     python download_model.py --model flan-t5-small
     python download_model.py --model google/flan-t5-small --variants int8,q4
     python download_model.py --model Xenova/flan-t5-base --variants full,int8
+    python download_model.py --model qwen3 --variants q4 --workers 4
+    python download_model.py --model flan-t5-small --no-cache
+
+Files are stored once in a cache inside the output directory (<output-dir>/.cache,
+or --cache-dir) and linked into each model directory with relative symlinks, so
+the models tree stays self-contained (e.g. when mounted into a dev container).
+Where symlinks are not allowed the files are copied; --no-cache writes plain
+files into the model directory instead.
+
+Optional speedups:
+    pip install hf_transfer      # multi-connection Rust backend for large ONNX files
+    pip install pyahocorasick    # single-pass variant matching for large repos
 """
 
 import argparse
+import json
 import os
+import re
+import shutil
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict, Optional, Set
+from typing import Collection, Iterable, List, Dict, Optional, Set
 import logging
 
 # Configure logging
@@ -32,16 +48,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Try to import huggingface_hub
+# Optional: hf_transfer downloads large files over parallel connections. The
+# switch is read when huggingface_hub is imported (lazily, in ModelDownloader),
+# so it must be set first.
 try:
-    from huggingface_hub import hf_hub_download, list_repo_files, HfApi
-    from huggingface_hub.utils import HfHubHTTPError, RepositoryNotFoundError
+    import hf_transfer
+    os.environ.setdefault("HF_HUB_ENABLE_HF_TRANSFER", "1")
 except ImportError:
-    logger.error("huggingface_hub not found. Installing...")
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "huggingface_hub"])
-    from huggingface_hub import hf_hub_download, list_repo_files, HfApi
-    from huggingface_hub.utils import HfHubHTTPError, RepositoryNotFoundError
+    hf_transfer = None
+
+# Optional: pyahocorasick matches all variant patterns in one pass per file name
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 
 # Model registry with known ONNX models
@@ -90,17 +110,80 @@ MODEL_REGISTRY = {
     },
 }
 
-# Variant mapping for file patterns
-VARIANT_PATTERNS = {
-    "full": ["encoder_model.onnx", "decoder_model.onnx", "decoder_with_past_model.onnx",
-             "model.onnx", "decoder_model_merged.onnx"],
-    "fp16": ["_fp16.onnx", "-fp16.onnx"],
-    "int8": ["_int8.onnx", "-int8.onnx", "_quantized.onnx"],
-    "q4": ["_int4.onnx", "-int4.onnx", "_q4.onnx", "-q4.onnx"],
+# Lowercase registry index for case-insensitive name resolution
+_REGISTRY_LOWER = {name.lower(): name for name in MODEL_REGISTRY}
+
+# Unquantized base model file names (the "full" variant)
+BASE_FILENAMES = frozenset({
+    "encoder_model.onnx",
+    "decoder_model.onnx",
+    "decoder_with_past_model.onnx",
+    "model.onnx",
+    "decoder_model_merged.onnx",
+})
+
+# Quantization suffixes per variant, disjoint from the base file names
+QUANT_SUFFIXES = {
+    "fp16": ("_fp16.onnx", "-fp16.onnx"),
+    "int8": ("_int8.onnx", "-int8.onnx", "_quantized.onnx"),
+    "q4": ("_int4.onnx", "-int4.onnx", "_q4.onnx", "-q4.onnx"),
 }
 
+# Variant mapping for file patterns (combined view)
+VARIANT_PATTERNS = {"full": tuple(BASE_FILENAMES), **QUANT_SUFFIXES}
+
+
+def _alternation(patterns: Iterable[str]) -> str:
+    """Join literal patterns into a regex alternation"""
+    return "|".join(re.escape(pattern) for pattern in patterns)
+
+
+def _suffix_regex(alternation: str) -> "re.Pattern":
+    """Compile an alternation into one case-insensitive regex (ONNX file or its _data shard)"""
+    return re.compile(f"(?:{alternation})(?:_data)?$", re.IGNORECASE)
+
+
+# Precompiled matchers: one search per file instead of a scan over every pattern.
+# QUANT_RE names each group after its variant, so match.lastgroup is the variant.
+QUANT_RE = _suffix_regex("|".join(
+    f"(?P<{variant}>{_alternation(suffixes)})" for variant, suffixes in QUANT_SUFFIXES.items()
+))
+BASE_RE = _suffix_regex(_alternation(BASE_FILENAMES))
+
+
+def _build_variant_automaton():
+    """Build an Aho-Corasick automaton mapping every variant pattern to its variant"""
+    automaton = ahocorasick.Automaton()
+    for variant, patterns in VARIANT_PATTERNS.items():
+        for pattern in patterns:
+            automaton.add_word(pattern, variant)
+    automaton.make_automaton()
+    return automaton
+
+
+VARIANT_AUTOMATON = _build_variant_automaton() if ahocorasick else None
+
+
+def _match_variants(file_path: str) -> Set[str]:
+    """
+    Return the variants an ONNX file belongs to.
+
+    Quantization suffixes take precedence; an unquantized base model file
+    maps to {"full"}. Uses the Aho-Corasick automaton when pyahocorasick is
+    installed, otherwise the precompiled regexes.
+    """
+    if VARIANT_AUTOMATON is not None:
+        hits = {variant for _, variant in VARIANT_AUTOMATON.iter(file_path.lower())}
+        return hits - {"full"} or hits
+
+    match = QUANT_RE.search(file_path)
+    if match:
+        return {match.lastgroup}
+    return {"full"} if BASE_RE.search(file_path) else set()
+
+
 # Essential config files to always download
-ESSENTIAL_FILES = [
+ESSENTIAL_FILES = frozenset([
     "config.json",
     "generation_config.json",
     "tokenizer_config.json",
@@ -111,32 +194,61 @@ ESSENTIAL_FILES = [
     "vocab.txt",
     "sentencepiece.bpe.model",
     "tokenizer.model",
-]
+])
+
+# Repository file listings cached between invocations, keyed by commit sha
+LISTING_CACHE_DIR = Path.home() / ".cache" / "onnxruntime-java-downloader"
 
 
 class ModelDownloader:
     """Downloads ONNX models from HuggingFace Hub with variant filtering"""
 
-    def __init__(self, output_dir: str = None):
+    def __init__(
+        self,
+        output_dir: str = None,
+        max_workers: int = 8,
+        use_cache: bool = True,
+        cache_dir: str = None
+    ):
         self.output_dir = Path(output_dir) if output_dir else Path(__file__).parent
+        self.max_workers = max_workers
+        # Shared content-addressed blob store; model directories symlink into it.
+        # It lives inside the output directory by default so relative links keep
+        # working wherever the tree is mounted; cache_dir can point elsewhere.
+        self.use_cache = use_cache
+        self.cache_dir = Path(cache_dir) if cache_dir else self.output_dir / ".cache"
+        # Imported here rather than at module level so --list works without it
+        try:
+            from huggingface_hub import HfApi
+        except ImportError:
+            raise SystemExit("huggingface_hub required: pip install huggingface_hub hf_transfer")
         self.api = HfApi()
 
-    def list_models(self):
+        if hf_transfer is None:
+            logger.info("Install hf_transfer for 5-10x faster large-file downloads: pip install hf_transfer")
+
+    @staticmethod
+    def list_models():
         """List all available models in the registry"""
-        print("\n" + "="*80)
-        print("Available ONNX Models")
-        print("="*80 + "\n")
+        # Build the whole listing and write it once instead of a print() per line
+        parts: List[str] = [
+            "\n" + "="*80 + "\n",
+            "Available ONNX Models\n",
+            "="*80 + "\n\n",
+        ]
 
         for name, info in MODEL_REGISTRY.items():
-            print(f"  {name:<20} - {info['description']}")
-            print(f"  {'':20}   Repo: {info['repo']}")
-            print(f"  {'':20}   Size: ~{info['size_mb']}MB (FULL variant)")
-            print()
-
-        print("Usage:")
-        print(f"  python {Path(__file__).name} --model <model_name> [--variants full,int8,q4]")
-        print(f"  python {Path(__file__).name} --model <huggingface_repo>")
-        print()
+            parts.append(f"  {name:<20} - {info['description']}\n")
+            parts.append(f"  {'':20}   Repo: {info['repo']}\n")
+            parts.append(f"  {'':20}   Size: ~{info['size_mb']}MB (FULL variant)\n")
+            parts.append("\n")
+
+        parts.append("Usage:\n")
+        parts.append(f"  python {Path(__file__).name} --model <model_name> [--variants full,int8,q4]\n")
+        parts.append(f"  python {Path(__file__).name} --model <huggingface_repo>\n")
+        parts.append("\n")
+
+        sys.stdout.write("".join(parts))
 
     def resolve_repo_id(self, model_name: str) -> str:
         """
@@ -151,27 +263,77 @@ class ModelDownloader:
         if "/" in model_name:
             return model_name
 
+        # Check if it's a case-insensitive alias
+        name_lower = model_name.lower()
+        if name_lower in _REGISTRY_LOWER:
+            return MODEL_REGISTRY[_REGISTRY_LOWER[name_lower]]["repo"]
+
         # Check if it's a partial match in registry
-        matches = [name for name in MODEL_REGISTRY.keys() if model_name.lower() in name.lower()]
-        if matches:
-            logger.info(f"Found partial match: {matches[0]}")
-            return MODEL_REGISTRY[matches[0]]["repo"]
+        match = next((name for lower, name in _REGISTRY_LOWER.items() if name_lower in lower), None)
+        if match:
+            logger.info(f"Found partial match: {match}")
+            return MODEL_REGISTRY[match]["repo"]
 
         raise ValueError(f"Unknown model: {model_name}. Use --list to see available models.")
 
-    def get_repo_files(self, repo_id: str) -> List[str]:
-        """Get list of all files in the repository"""
+    def get_repo_files(self, repo_id: str) -> Dict[str, Optional[int]]:
+        """
+        Get all files in the repository, mapped to their size in bytes.
+
+        Listings are cached on disk per commit sha, so repeated downloads of the
+        same model only need a lightweight sha lookup.
+        """
+        from huggingface_hub.utils import HfHubHTTPError, RepositoryNotFoundError
+
         try:
-            files = list_repo_files(repo_id=repo_id)
+            sha = self.api.model_info(repo_id, expand=["sha"]).sha
+            cache_path = LISTING_CACHE_DIR / f"{repo_id.replace('/', '--')}--{sha}.json"
+            if cache_path.exists():
+                try:
+                    cached = json.loads(cache_path.read_text())
+                    if isinstance(cached, dict):
+                        return cached
+                except (OSError, ValueError):
+                    logger.warning(f"Ignoring unreadable listing cache: {cache_path}")
+
+            info = self.api.model_info(repo_id, revision=sha, files_metadata=True)
+            files = {sibling.rfilename: sibling.size for sibling in info.siblings}
+            self._write_listing_cache(cache_path, files)
             return files
         except RepositoryNotFoundError:
             raise ValueError(f"Repository not found: {repo_id}")
         except HfHubHTTPError as e:
             raise ValueError(f"Error accessing repository {repo_id}: {e}")
 
+    @staticmethod
+    def _write_listing_cache(cache_path: Path, files: Dict[str, Optional[int]]):
+        """
+        Best-effort write of a listing cache entry.
+
+        Writes through a temporary file and os.replace so concurrent runs never
+        see half-written JSON, and removes entries for older commits of the same
+        repository. Failures (e.g. read-only home directory) are only logged.
+        """
+        prefix = cache_path.name[:cache_path.name.rindex("--") + 2]
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(json.dumps(files))
+            os.replace(tmp_path, cache_path)
+            for stale in cache_path.parent.glob(f"{prefix}*.json"):
+                # Only "<prefix><sha>.json", not another repo sharing the prefix
+                if stale != cache_path and re.fullmatch(r"[0-9a-f]+", stale.name[len(prefix):-5]):
+                    stale.unlink()
+        except OSError as e:
+            logger.warning(f"Could not write listing cache {cache_path}: {e}")
+            try:
+                tmp_path.unlink(missing_ok=True)
+            except OSError:
+                pass
+
     def filter_files_by_variants(
         self,
-        all_files: List[str],
+        all_files: Collection[str],
         variants: Optional[List[str]] = None
     ) -> Dict[str, List[str]]:
         """
@@ -182,93 +344,193 @@ class ModelDownloader:
             variants = ["full", "fp16", "int8", "q4"]
 
         # Normalize variant names
-        variants = [v.lower().strip() for v in variants]
+        variants = {v.lower().strip() for v in variants}
 
-        # Find ONNX model files
-        onnx_files = []
+        # Classify every file in a single pass; dict keys dedupe and keep order
+        onnx_files = {}
+        config_files = {}
+        all_files_set = set(all_files)
         for file_path in all_files:
-            if not file_path.endswith(".onnx") and not file_path.endswith(".onnx_data"):
+            if file_path.endswith(".onnx"):
+                if _match_variants(file_path) & variants:
+                    onnx_files[file_path] = None
+                    # External-data shard travels with its graph, so shards of
+                    # unselected graphs are never pulled
+                    shard = file_path + "_data"
+                    if shard in all_files_set:
+                        onnx_files[shard] = None
+            elif file_path.endswith(".onnx_data"):
                 continue
-
-            file_lower = file_path.lower()
-
-            # Check each variant
-            for variant in variants:
-                if variant == "full":
-                    # Full models don't have quantization suffixes
-                    if not any(pattern in file_lower for patterns in VARIANT_PATTERNS.values()
-                             for pattern in patterns if pattern != "encoder_model.onnx"
-                             and pattern != "decoder_model.onnx"
-                             and pattern != "decoder_with_past_model.onnx"
-                             and pattern != "model.onnx"
-                             and pattern != "decoder_model_merged.onnx"):
-                        # It's a base model file without quantization suffix
-                        if any(base in file_lower for base in ["encoder_model.onnx", "decoder_model.onnx",
-                                                                "decoder_with_past_model.onnx", "model.onnx",
-                                                                "decoder_model_merged.onnx"]):
-                            onnx_files.append(file_path)
-                            break
-                else:
-                    # Check if file matches variant patterns
-                    patterns = VARIANT_PATTERNS.get(variant, [])
-                    if any(pattern in file_lower for pattern in patterns):
-                        onnx_files.append(file_path)
-                        break
-
-        # Find essential config files
-        config_files = []
-        for file_path in all_files:
-            file_name = Path(file_path).name
-            # Check if it's an essential file or in onnx subdirectory with essential name
-            if file_name in ESSENTIAL_FILES:
-                config_files.append(file_path)
-            elif "onnx" in file_path.lower() and file_name in ESSENTIAL_FILES:
-                config_files.append(file_path)
-
-        # Remove duplicates while preserving order
-        onnx_files = list(dict.fromkeys(onnx_files))
-        config_files = list(dict.fromkeys(config_files))
+            elif file_path.rpartition("/")[2] in ESSENTIAL_FILES:
+                # Essential config file at any depth (e.g. in the onnx subdirectory)
+                config_files[file_path] = None
 
         return {
-            "onnx": onnx_files,
-            "config": config_files
+            "onnx": list(onnx_files),
+            "config": list(config_files)
         }
 
+    def download_snapshot(
+        self,
+        repo_id: str,
+        files: List[str],
+        local_dir: Path,
+        file_sizes: Optional[Dict[str, Optional[int]]] = None
+    ) -> List[Path]:
+        """
+        Download files with snapshot_download, restricted to the given paths.
+
+        huggingface_hub downloads the files concurrently and resumes partial
+        files left by an interrupted run. With the shared cache enabled, blobs
+        are stored once in the cache and symlinked (or copied) into local_dir.
+        If the snapshot fails, fall back to per-file downloads so one bad file
+        does not abort the rest.
+        """
+        from huggingface_hub import snapshot_download
+
+        try:
+            if not self.use_cache:
+                snapshot_download(
+                    repo_id=repo_id,
+                    local_dir=local_dir,
+                    allow_patterns=files,
+                    max_workers=self.max_workers
+                )
+            else:
+                snapshot_dir = Path(snapshot_download(
+                    repo_id=repo_id,
+                    cache_dir=self.cache_dir,
+                    allow_patterns=files,
+                    max_workers=self.max_workers
+                ))
+                for file_path in files:
+                    self._link_cached_file(snapshot_dir / file_path, local_dir / file_path)
+        except Exception as e:
+            logger.warning(f"Snapshot download failed ({e}), retrying file by file...")
+            return self.download_files(repo_id, files, local_dir, file_sizes=file_sizes)
+
+        return [local_dir / file_path for file_path in files]
+
+    def _fetch_file(self, repo_id: str, file_path: str, local_dir: Path, force: bool = False):
+        """Download a single file, through the shared cache unless it is disabled"""
+        from huggingface_hub import hf_hub_download
+
+        if not self.use_cache:
+            hf_hub_download(repo_id=repo_id, filename=file_path, local_dir=local_dir, force_download=force)
+        else:
+            cached_file = hf_hub_download(
+                repo_id=repo_id,
+                filename=file_path,
+                cache_dir=self.cache_dir,
+                force_download=force
+            )
+            self._link_cached_file(Path(cached_file), local_dir / file_path)
+
+    @staticmethod
+    def _link_cached_file(cached_file: Path, local_file: Path):
+        """
+        Symlink a cached blob into the model directory.
+
+        The link is relative, so it stays valid when the models tree is moved or
+        mounted elsewhere. Where symlinks are not allowed (e.g. Windows without
+        developer mode), copy the blob instead, as huggingface_hub itself does.
+        """
+        blob = cached_file.resolve()
+        local_file.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            target = os.path.relpath(blob, local_file.parent.resolve())
+        except ValueError:
+            # No relative path exists (e.g. cache on another Windows drive)
+            target = str(blob)
+        if local_file.is_symlink():
+            if os.readlink(local_file) == target:
+                return
+        elif local_file.exists():
+            # Copy left by an earlier run without symlink support: keep it if it
+            # still matches the blob instead of re-copying multi-GB files
+            local_stat, blob_stat = local_file.stat(), blob.stat()
+            if local_stat.st_size == blob_stat.st_size and local_stat.st_mtime == blob_stat.st_mtime:
+                return
+
+        if local_file.is_symlink() or local_file.exists():
+            local_file.unlink()
+        try:
+            local_file.symlink_to(target)
+        except OSError:
+            # Copy under a temporary name first so an interrupted copy never
+            # leaves a truncated file that looks complete
+            tmp_file = local_file.with_name(local_file.name + ".incomplete")
+            shutil.copy2(blob, tmp_file)
+            os.replace(tmp_file, local_file)
+
     def download_files(
         self,
         repo_id: str,
         files: List[str],
         local_dir: Path,
-        desc: str = "files"
+        desc: str = "files",
+        file_sizes: Optional[Dict[str, Optional[int]]] = None
     ) -> List[Path]:
-        """Download files from repository to local directory"""
+        """
+        Download files from repository to local directory using a thread pool.
+
+        A local file counts as complete when its size matches the size from the
+        repository listing (file_sizes), so a truncated file is re-downloaded
+        without any HEAD requests. Without a known size, existence is enough.
+
+        Files are submitted largest first. This only applies to this per-file
+        path; snapshot_download (the default path) keeps the hub's own order.
+        """
+        from huggingface_hub.utils import tqdm
+
         downloaded = []
+        file_sizes = file_sizes or {}
 
-        for file_path in files:
-            try:
-                # Determine local path
-                local_file = local_dir / file_path
+        # Largest files first, so a big shard doesn't start last and set the finish time
+        files = sorted(files, key=lambda f: -(file_sizes.get(f) or 0))
+
+        # One directory walk instead of a stat() per requested file
+        existing = {}
+        if local_dir.exists():
+            existing = {
+                p.relative_to(local_dir).as_posix(): p.stat().st_size
+                for p in local_dir.rglob("*") if p.is_file()
+            }
 
-                # Skip if already exists
-                if local_file.exists():
+        # Skip complete files before submission so they don't occupy a worker slot
+        pending = []
+        for file_path in files:
+            local_file = local_dir / file_path
+            force = False
+            if file_path in existing:
+                expected_size = file_sizes.get(file_path)
+                if expected_size is None or existing[file_path] == expected_size:
                     logger.info(f"  ✓ Already exists: {file_path}")
                     downloaded.append(local_file)
                     continue
-
-                # Create parent directories
-                local_file.parent.mkdir(parents=True, exist_ok=True)
-
-                # Download file
-                logger.info(f"  ↓ Downloading: {file_path}")
-                hf_hub_download(
-                    repo_id=repo_id,
-                    filename=file_path,
-                    local_dir=local_dir
-                )
-                downloaded.append(local_file)
-
-            except Exception as e:
-                logger.warning(f"  ⚠ Failed to download {file_path}: {e}")
+                logger.info(f"  ↻ Size mismatch, re-downloading: {file_path}")
+                force = True
+
+            local_file.parent.mkdir(parents=True, exist_ok=True)
+            pending.append((file_path, local_file, force))
+
+        if not pending:
+            return downloaded
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+            for file_path, local_file, force in pending:
+                future = executor.submit(self._fetch_file, repo_id, file_path, local_dir, force)
+                futures[future] = (file_path, local_file)
+
+            # One aggregate progress bar instead of a log line per file
+            for future in tqdm(as_completed(futures), total=len(futures), desc=f"Downloading {desc}"):
+                file_path, local_file = futures[future]
+                try:
+                    future.result()
+                    downloaded.append(local_file)
+                except Exception as e:
+                    tqdm.write(f"  ⚠ Failed to download {file_path}: {e}")
 
         return downloaded
 
@@ -339,17 +601,17 @@ class ModelDownloader:
         print()
 
         # Download files
-        logger.info("Downloading ONNX model files...")
-        downloaded_onnx = self.download_files(repo_id, onnx_files, local_dir, "ONNX models")
-
-        logger.info("Downloading config files...")
-        downloaded_config = self.download_files(repo_id, config_files, local_dir, "config files")
+        logger.info("Downloading ONNX model and config files...")
+        files = onnx_files + config_files
+        downloaded = self.download_snapshot(repo_id, files, local_dir, file_sizes=all_files)
 
         # Print summary
-        total_downloaded = len(downloaded_onnx) + len(downloaded_config)
         print("\n" + "="*80)
-        print(f"✓ Download Complete!")
-        print(f"  Total files: {total_downloaded}")
+        if len(downloaded) == len(files):
+            print(f"✓ Download Complete!")
+        else:
+            print(f"⚠ Download Incomplete: {len(files) - len(downloaded)} file(s) failed")
+        print(f"  Total files: {len(downloaded)} of {len(files)}")
         print(f"  Location: {local_dir}")
         print("="*80 + "\n")
 
@@ -438,14 +700,33 @@ Variants:
         help="Output directory for downloaded models (default: ./models)"
     )
 
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Download directly into the model directory instead of symlinking from the shared cache"
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="Shared download cache (default: <output-dir>/.cache)"
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of parallel file downloads (default: 8)"
+    )
+
     args = parser.parse_args()
 
-    # Create downloader
-    downloader = ModelDownloader(output_dir=args.output_dir)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
 
-    # Handle list command
+    # Handle list command (needs no huggingface_hub)
     if args.list:
-        downloader.list_models()
+        ModelDownloader.list_models()
         return 0
 
     # Require model name
@@ -458,6 +739,14 @@ Variants:
     except ValueError as e:
         parser.error(str(e))
 
+    # Create downloader
+    downloader = ModelDownloader(
+        output_dir=args.output_dir,
+        max_workers=args.workers,
+        use_cache=not args.no_cache,
+        cache_dir=args.cache_dir
+    )
+
     # Download model
     try:
         downloader.download_model(args.model, variants)
@@ -83,8 +83,8 @@ else
     # Install ONNX tools
     pip install onnx onnxruntime
 
-    # Install HuggingFace Hub for model downloads
-    pip install huggingface_hub
+    # Install HuggingFace Hub for model downloads (hf_transfer speeds up large files)
+    pip install huggingface_hub hf_transfer
 
     pip install --upgrade optimum[onnxruntime]
 